@@ -1,12 +1,21 @@
 #!/usr/bin/env python3
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import json
+import itertools
+import mmap
+import os
 from pathlib import Path
 import re
 import sys
 
+try:
+    # Optional faster parser, the standard library json is used when not installed.
+    import orjson as _json
+except ImportError:
+    import json as _json
+
 
 def cli(*arguments) -> int:
     """
@@ -103,11 +112,32 @@ def cli(*arguments) -> int:
     return parser.run([str(a) for a in arguments])
 
 
-re_number_heading = re.compile("##\s\[([0-9]*.[0-9]*.[0-9]*)\] - ([0-9]*-[0-9]*-[0-9]*)")
-re_unreleased_header = re.compile("##\s\[Unreleased\]")
-re_links_start = re.compile("\[Keep a Changelog\]")
+_UNRELEASED_HEADING = r"##\s\[Unreleased\]"
+re_unreleased_header = re.compile(r"\A" + _UNRELEASED_HEADING, re.ASCII)
 github_compare = "https://github.com/casper-network/casper-node/compare/"
-re_unreleased_link = re.compile(f"\[unreleased\]: {github_compare}(v.[0-9]*.[0-9]*.[0-9]*)...dev")
+re_unreleased_link = re.compile(r"\A\[unreleased\]: " + re.escape(github_compare) + r"(v\d+\.\d+\.\d+)\.\.\.dev",
+                                re.ASCII)
+# Any section boundary in one pass; lastgroup names the section kind.
+# Shares _UNRELEASED_HEADING with re_unreleased_header.
+re_section_start = re.compile(
+    r"\A(?:(?P<unreleased>" + _UNRELEASED_HEADING + ")"
+    r"|##\s\[(?P<version>\d+\.\d+\.\d+)\]\s-\s\d+-\d+-\d+"
+    r"|(?P<bottom>\[Keep a Changelog\]))",
+    re.ASCII
+)
+# bump_version works on undecoded lines, so it uses bytes versions of its patterns and link templates.
+# The str patterns are compiled with re.ASCII, so \s and \d match ASCII characters only, as they always do in bytes
+# patterns. The bytes patterns are compiled from the str .pattern, so str and bytes match the same lines.
+re_unreleased_header_bytes = re.compile(re_unreleased_header.pattern.encode())
+re_unreleased_link_bytes = re.compile(re_unreleased_link.pattern.encode())
+_UNRELEASED_LINK_FMT = ("[unreleased]: " + github_compare + "v%s...dev").encode()
+_VERSION_LINK_FMT = ("[%s]: " + github_compare + "%s...v%s").encode()
+
+# Bound match methods, resolved once rather than per line in the parsing loops.
+_M_UNREL_LINK = re_unreleased_link.match
+_M_SECTION = re_section_start.match
+_M_UNREL_BYTES = re_unreleased_header_bytes.match
+_M_UNREL_LINK_BYTES = re_unreleased_link_bytes.match
 
 casper_node_changelogs = (
     ("Casper Node (node/)", "node/CHANGELOG.md"),
@@ -121,40 +151,71 @@ casper_node_changelogs = (
 )
 
 MAX_EMPTY_LINES = 3
+# Upper bound on threads used by combine_files to read and parse the files listed in a JSON file.
+MAX_WORKERS = 8
+# Files at least this size are read through mmap rather than copied into a read() buffer.
+MMAP_THRESHOLD = 64 * 1024
 
 SCRIPT_DIR = Path(__file__).parent.absolute()
 CASPER_NODE_DIR = SCRIPT_DIR.parent / "casper-node"
 
 
-def _get_changelog_sections(changelog_text: list):
+def _read_lines(path: str, decode: bool = True) -> list:
+    """
+    Reads a UTF-8 text file as a list of lines, memory mapping large files that are decoded.
+
+    :param path: path to file
+    :param decode: flag for decoding lines to str rather than returning bytes
+    :return: list of str, or of bytes if not decode
+    """
+    # Binary mode open, so both branches see the raw bytes (os.open would use CRT text mode on Windows).
+    with open(path, "rb") as f:
+        if decode and os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+            # Decode straight from the mapping, without an intermediate bytes copy.
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                data = str(mm, "utf-8")
+        else:
+            # Undecoded lines need a bytes object anyway, which a plain read produces with a single copy.
+            data = f.read()
+            if decode:
+                data = data.decode("utf-8")
+    return data.splitlines()
+
+
+def _iter_changelog_sections(changelog_text: list):
     """
-    Breaks changelog into
+    Breaks changelog into sections, yielding each as soon as its end is found
 
     :param changelog_text: list of lines from the changelog file
-    :return: list of (section_name, list of lines)
+    :return: generator of (section_name, list of lines)
     """
-    sections = []
     section = 'top'
     section_data = []
     for line in changelog_text:
-        unreleased_match = re_unreleased_header.match(line)
-        num_header_match = re_number_heading.match(line)
-        links_start_match = re_links_start.match(line)
-        if unreleased_match:
-            sections.append((section, section_data))
-            section = 'unreleased'
-            section_data = []
-        elif num_header_match:
-            sections.append((section, section_data))
-            section = num_header_match.group(1)
-            section_data = []
-        elif links_start_match:
-            sections.append((section, section_data))
-            section = 'bottom'
+        # Section boundaries only start with "##" or "[", so most lines skip the regex call entirely.
+        head = line[:2]
+        if (head == "##" or head[:1] == "[") and (section_match := _M_SECTION(line)):
+            yield section, section_data
+            section = section_match.lastgroup
+            if section == 'version':
+                # Interned so the same version from every file is one object, making key compares identity checks.
+                section = sys.intern(section_match.group('version'))
             section_data = []
         section_data.append(line)
-    sections.append((section, section_data))
-    return sections
+    yield section, section_data
+
+
+def _get_section_buckets(file_path: str) -> dict:
+    """
+    Reads changelog file and groups its sections by name.
+
+    :param file_path: path to changelog file
+    :return: dict of section_name: list of section line lists
+    """
+    buckets = {}
+    for name, section_data in _iter_changelog_sections(_read_lines(file_path)):
+        buckets.setdefault(name, []).append(section_data)
+    return buckets
 
 
 def _section_has_changes(section_data) -> bool:
@@ -164,13 +225,41 @@ def _section_has_changes(section_data) -> bool:
     :param section_data: list of lines
     :return: boolean
     """
-    non_empty_lines = [line.strip() for line in section_data[1:] if line.strip()]
-    if len(non_empty_lines) == 0:
+    first_line = None
+    for line in itertools.islice(section_data, 1, None):
+        line = line.strip()
+        if not line:
+            continue
+        if first_line is not None:
+            # A second non-empty line means more than a "No changes." note.
+            return True
+        first_line = line
+    if first_line is None:
         return False
-    if len(non_empty_lines) == 1:
-        if "no changes" in non_empty_lines[0].lower():
-            return False
-    return True
+    return "no changes" not in first_line.lower()
+
+
+def _semver_key(version: str) -> tuple:
+    """
+    Sort key ordering SemVer section names numerically, with non-numeric names last
+
+    :param version: SemVer str, such as "1.2.3"
+    :return: tuple of int
+    """
+    parts = version.split(".")
+    if not all(part.isdecimal() for part in parts):
+        return (float("-inf"),)
+    return tuple(int(part) for part in parts)
+
+
+def _bump_heading(line: str) -> str:
+    """
+    Moves a "###" heading down one level, leaving other lines untouched.
+
+    :param line: str
+    :return: str
+    """
+    return "#" + line if line.startswith("###") else line
 
 
 def combine_files(files: str, target: str, overwrite: bool, unreleased: bool):
@@ -185,65 +274,68 @@ def combine_files(files: str, target: str, overwrite: bool, unreleased: bool):
     :return: exit code
     """
     json_file = Path(files)
-    json_data = json.loads(json_file.read_text())
-    section_set = set()
-    all_files = []
-    for label, file_path in json_data:
-        file_data = Path(file_path).read_text().splitlines()
-        sections = _get_changelog_sections(file_data)
-        all_files.append((label, sections))
-        for name, section_data in sections:
-            section_set.add(name)
-    section_set.difference_update({"top", "unreleased", "bottom"})
+    json_data = _json.loads(json_file.read_bytes())
+    # Files are independent, so read and parse them concurrently. map keeps the input order.
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(json_data)))) as executor:
+        all_buckets = executor.map(_get_section_buckets, [file_path for _, file_path in json_data])
+        all_files = [(label, buckets) for (label, _), buckets in zip(json_data, all_buckets)]
+    # dict keys only dedupe section names; ordering comes from the sort below.
+    section_names = {}
+    for _, buckets in all_files:
+        for name in buckets:
+            section_names[name] = None
+    for special_name in ("top", "unreleased", "bottom"):
+        section_names.pop(special_name, None)
 
     # Start output with the top section of the first file.
-    output = [[line for line in section_data] for name, section_data in all_files[0][1] if name == "top"][0]
-    section_list = sorted(list(section_set), reverse=True)
+    first_buckets = all_files[0][1]
+    output = list(first_buckets["top"][0])
+    section_list = sorted(section_names, key=_semver_key, reverse=True)
     if unreleased:
         section_list.insert(0, "unreleased")
     # Combine sections
     for section_name in section_list:
         first_line = False
-        for label, sections in all_files:
-            for name, section_data in [(nm, sd) for nm, sd in sections if nm == section_name]:
+        for label, buckets in all_files:
+            for section_data in buckets.get(section_name, ()):
                 if not first_line:
                     output.append(section_data[0])
                     first_line = True
                 if not _section_has_changes(section_data):
                     continue
-                output.extend(["", f"### {label}"])
+                output.append("")
+                output.append(f"### {label}")
                 # Assumes leading whitespace after first line and strips to one empty line.
                 # Bumping change type down one level due to new label section
-                output.extend([line.replace("###", "####")
-                               for line in _clean_extra_empty_lines(section_data[1:], 1)])
+                for line in _clean_extra_empty_lines(section_data[1:], 1):
+                    output.append(_bump_heading(line))
     # Add bottom links from first file
-    for section_data in [section_data for name, section_data in all_files[0][1] if name == "bottom"]:
+    for section_data in first_buckets.get("bottom", ()):
         for line in section_data:
-            if not unreleased and re_unreleased_link.match(line):
+            if not unreleased and _M_UNREL_LINK(line):
                 continue
             output.append(line)
 
-    output_file = Path(target)
-    if output_file.exists() and not overwrite:
+    if os.path.exists(target) and not overwrite:
         print(f"target file: {target} exists, but overwrite flag not provided. Aborting.")
         return 1
 
-    output_file.write_text("\n".join(output))
+    Path(target).write_bytes("\n".join(output).encode("utf-8"))
     return 0
 
 
 def _clean_extra_empty_lines(text_lines: list, line_count: int = MAX_EMPTY_LINES) -> list:
     """
-    Trims more than line_count empty lines
+    Trims more than line_count empty lines, keeping other lines as-is.
+    Only ASCII whitespace counts as empty, so str and bytes lines are treated alike.
 
-    :param text_lines: file_text as list of str
-    :return: list of str
+    :param text_lines: file_text as list of str or bytes
+    :return: list of str or bytes
     """
     output = []
     clean_line_count = 0
     for line in text_lines:
-        line = line.strip()
-        if line == "":
+        if not line or (line.isspace() and line.isascii()):
             clean_line_count += 1
         else:
             clean_line_count = 0
@@ -254,7 +346,9 @@ def _clean_extra_empty_lines(text_lines: list, line_count: int = MAX_EMPTY_LINES
 
 def version_files(files: str, version: str, unreleased: bool, label: str = None) -> int:
     json_file = Path(files)
-    json_data = json.loads(json_file.read_text())
+    json_data = _json.loads(json_file.read_bytes())
+    # Files are rewritten in place, so stay sequential: a failure stops before later files are touched,
+    # and a path listed twice is bumped deterministically.
     for _, file_path in json_data:
         bump_version(file_path, file_path, True, version, unreleased, label)
 
@@ -274,29 +368,31 @@ def bump_version(source: str, target: str, overwrite: bool, version: str, unrele
     if label is None:
         label = datetime.today().strftime('%Y-%m-%d')
 
-    source_text = Path(source).read_text().splitlines()
-    target_file = Path(target)
-    if target_file.exists() and not overwrite:
+    # Lines are only matched and copied, so they stay undecoded bytes from read to write.
+    source_text = _read_lines(source, decode=False)
+    if os.path.exists(target) and not overwrite:
         print(f"target file: {target} exists, but overwrite flag not provided. Aborting.")
         return 1
 
+    version_bytes = version.encode("utf-8")
     output = []
     for line in source_text:
-        link_match = re_unreleased_link.match(line)
-        if link_match:
-            if unreleased:
-                output.append(f"[unreleased]: {github_compare}v{version}...dev")
-            output.append(f"[{version}]: {github_compare}{link_match.group(1)}...v{version}")
-            continue
-        if re_unreleased_header.match(line):
+        # Prefix checks decide which pattern, if any, can match; regex only runs on candidate lines.
+        if line.startswith(b"[unreleased]: "):
+            if link_match := _M_UNREL_LINK_BYTES(line):
+                if unreleased:
+                    output.append(_UNRELEASED_LINK_FMT % version_bytes)
+                output.append(_VERSION_LINK_FMT % (version_bytes, link_match.group(1), version_bytes))
+                continue
+        elif line.startswith(b"##") and _M_UNREL_BYTES(line):
             if unreleased:
                 output.append(line)
-                output.extend(["\n", "No changes.", "\n", "\n", "\n"])
-            output.append(f"## [{version}] - {label}")
+                output.extend([b"", b"No changes.", b"", b"", b""])
+            output.append(f"## [{version}] - {label}".encode("utf-8"))
             continue
         output.append(line)
     output = _clean_extra_empty_lines(output)
-    target_file.write_text("\n".join(output))
+    Path(target).write_bytes(b"\n".join(output))
     return 0
 
 